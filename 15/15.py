@@ -8,14 +8,62 @@ import heapq as hq
 from itertools import count
 import time
 import math
+import unittest
+import contextlib
+import os
+import tempfile
 
 def read_input(fname: str):
+    if fname.endswith('.npy'):
+        return load_grid(fname)
     with open(fname) as f:
         return np.array([
             list(map(int, line.strip()))
             for line in f
         ], dtype=np.int32)
 
+#
+# Caves too big to parse into python lists can be converted, once, to a
+# .npy file and then memory-mapped rather than read into memory. Risks
+# are single digits, so one byte a cell is plenty. The conversion
+# streams the text a line at a time and so needs no more memory than
+# one row.
+#
+
+def convert_input(fname: str, npyname: str):
+    with open(fname, 'rb') as f:
+        ncol = len(next(f).strip())
+        nrow = 1 + sum(1 for line in f if line.strip())
+    grid = np.lib.format.open_memmap(
+        npyname, mode='w+', dtype=np.uint8, shape=(nrow, ncol))
+    with open(fname, 'rb') as f:
+        for i, line in enumerate(line for line in f if line.strip()):
+            row = np.frombuffer(line.strip(), dtype=np.uint8) - ord('0')
+            assert row.shape == (ncol,), f'row {i} has the wrong length'
+            grid[i] = row
+    grid.flush()
+    return grid
+
+def load_grid(npyname: str) -> np.memmap:
+    return np.load(npyname, mmap_mode='r')
+
+def grid_full(costs, fill_value, dtype) -> np.ndarray:
+    """
+    Allocate a per-cell array for an engine working on `costs`. If the
+    costs are themselves memory-mapped (directly, or as the base tile
+    of a `TiledGrid`), the cave is presumably too big for memory, so
+    the new array is backed by an anonymous scratch file next to them
+    instead.
+    """
+    filename = getattr(costs, 'filename', None)
+    if filename is None:
+        return np.full(costs.shape, fill_value=fill_value, dtype=dtype)
+    scratch = tempfile.TemporaryFile(dir=os.path.dirname(filename))
+    with scratch:
+        grid = np.memmap(scratch, mode='w+', dtype=dtype, shape=costs.shape)
+    grid[...] = fill_value
+    return grid
+
 Coord = ty.Tuple[int, int]
 
 def neighbours(grid, row, col) -> ty.Iterable[ty.Tuple[int, int]]:
@@ -38,6 +86,11 @@ class StopWatch:
         self._prevlap = now
         return laptime
 
+def manhattan(p, q):
+    x0, y0 = p
+    x1, y1 = q
+    return abs(x0 - x1) + abs(y0 - y1)
+
 def dist_to(p, q):
     x0, y0 = p
     x1, y1 = q
@@ -52,6 +105,32 @@ def progress(tag, n, coord, distance, timer=None):
         # f'dend {dist_to(end, coord):.1f}',
     ]))
 
+# parents are stored as linear indices into the grid (row * ncol +
+# col) rather than as python tuples; the start node, and any node that
+# hasn't been reached, has this as its parent. the indices are int32
+# unless the grid has too many cells for that.
+NO_PARENT = -1
+
+def index_dtype(costs) -> type:
+    if math.prod(costs.shape) > np.iinfo(np.int32).max:
+        return np.int64
+    return np.int32
+
+def reconstruct_path(parent: np.ndarray, end: Coord) -> np.ndarray:
+    """
+    Follow `parent` links back from `end` to the root of the tree,
+    returning the path from the root to `end` as an (N, 2) array of
+    (row, col) coordinates.
+    """
+    links = parent.ravel()
+    i = int(np.ravel_multi_index(end, parent.shape))
+    path = [i]
+    while links[i] != NO_PARENT:
+        i = int(links[i])
+        path.append(i)
+    rows, cols = np.unravel_index(np.array(path[::-1]), parent.shape)
+    return np.column_stack((rows, cols))
+
 #
 # This is translated directly from the description of Dijkstra's
 # algorithm for finding a least cost spanning tree rooted at a given
@@ -59,15 +138,15 @@ def progress(tag, n, coord, distance, timer=None):
 # Skiena
 #
 
-def dijkstra(costs, start, end):
+def dijkstra(costs, start, end, stats=None):
     nrow, ncol = costs.shape
     print(f'dijkstra: {costs.shape = } {start = }')
     maxint = np.iinfo(np.int32).max
 
     weight = 0
-    intree = np.full_like(costs, fill_value=0, dtype=np.bool8)
-    distance = np.full_like(costs, fill_value=maxint)
-    parent = np.full_like(costs, fill_value=None, dtype=np.dtype('object'))
+    intree = grid_full(costs, 0, np.bool8)
+    distance = grid_full(costs, maxint, np.int32)
+    parent = grid_full(costs, NO_PARENT, index_dtype(costs))
 
     timer = StopWatch()
     dist = None
@@ -119,12 +198,13 @@ def dijkstra(costs, start, end):
         # whether or not we skip them before the check for an
         # improved distance.
 
+        vi = v[0] * ncol + v[1]
         coords = neighbours(costs, *v)
         for c in coords:
             if distance[c] > distance[v] + costs[c]:
                 assert not intree[c], "invariant violation"
                 distance[c] = distance[v] + costs[c]
-                parent[c] = v
+                parent[c] = vi
 
         # at this point, the node in the fringe with the
         # minimum assigned least cost path has it's correct
@@ -160,20 +240,483 @@ def dijkstra(costs, start, end):
 
     # after the loop, we now have a shortest-path spanning tree
     # rooted at the start node. return that and the parent data
-    # for reconstructing the shortest paths.
+    # for reconstructing the shortest paths (see `reconstruct_path`).
 
+    if stats is not None:
+        stats['settled'] = loops
     return parent, distance
-    
-def find_safest(costs, start, end):
-    parent, dist = dijkstra(costs, start, end)
+
+#
+# The same algorithm, but the fringe is kept in a binary heap instead
+# of being rediscovered with an argmin over the whole grid on every
+# iteration. Rather than supporting decrease-key, an improved distance
+# just pushes a fresh entry; stale entries are recognised when they're
+# popped (the node is already in the tree) and thrown away ("lazy
+# deletion"). This makes each step O(log V) instead of O(V).
+#
+
+def dijkstra_heap(costs, start, end, stats=None):
+    nrow, ncol = costs.shape
+    print(f'dijkstra_heap: {costs.shape = } {start = }')
+    maxint = np.iinfo(np.int32).max
+
+    intree = grid_full(costs, 0, np.bool8)
+    distance = grid_full(costs, maxint, np.int32)
+    parent = grid_full(costs, NO_PARENT, index_dtype(costs))
+
+    timer = StopWatch()
+    distance[start] = 0
+    fringe = [(0, start)]
+
+    every = 2500
+    loops = 0
+
+    while fringe:
+        dist, v = hq.heappop(fringe)
+        if intree[v]:
+            # stale entry: v was pushed again with a smaller
+            # distance and has already been added to the tree.
+            continue
+
+        loops += 1
+        if loops % every == 0:
+            progress('' if v != end else 'end!', loops, v, distance, timer)
+
+        intree[v] = True
+        vi = v[0] * ncol + v[1]
+        for c in neighbours(costs, *v):
+            if intree[c]:
+                continue
+            newdist = dist + int(costs[c])
+            if distance[c] > newdist:
+                distance[c] = newdist
+                parent[c] = vi
+                hq.heappush(fringe, (newdist, c))
+
+    if stats is not None:
+        stats['settled'] = loops
+    return parent, distance
+
+#
+# Dial's algorithm. Every edge costs between 1 and maxcost (9 for a
+# cave), so the tentative distances on the fringe always lie within
+# maxcost of the distance being settled. A circular array of maxcost+1
+# buckets, indexed by distance modulo its length, therefore holds the
+# whole fringe without any two live distances colliding, and push/pop
+# are both O(1). As with the heap, stale entries are skipped on pop.
+#
+
+def dijkstra_dial(costs, start, end, stats=None):
+    nrow, ncol = costs.shape
+    print(f'dijkstra_dial: {costs.shape = } {start = }')
+    maxint = np.iinfo(np.int32).max
+    maxcost = int(costs.max())
+    assert int(costs.min()) >= 1, "dial needs positive integer costs"
+
+    intree = grid_full(costs, 0, np.bool8)
+    distance = grid_full(costs, maxint, np.int32)
+    parent = grid_full(costs, NO_PARENT, index_dtype(costs))
+
+    timer = StopWatch()
+    nbuckets = maxcost + 1
+    buckets: list[list[Coord]] = [[] for _ in range(nbuckets)]
+    distance[start] = 0
+    buckets[0].append(start)
+    pending = 1
+
+    every = 2500
+    loops = 0
+    dist = 0
+
+    while pending:
+        bucket = buckets[dist % nbuckets]
+        if not bucket:
+            dist += 1
+            continue
+        v = bucket.pop()
+        pending -= 1
+        if intree[v]:
+            # stale: every entry in this bucket was pushed with
+            # distance `dist`, so if v's distance has since dropped
+            # it was settled from an earlier bucket.
+            continue
+
+        loops += 1
+        if loops % every == 0:
+            progress('' if v != end else 'end!', loops, v, distance, timer)
+
+        intree[v] = True
+        vi = v[0] * ncol + v[1]
+        for c in neighbours(costs, *v):
+            if intree[c]:
+                continue
+            newdist = dist + int(costs[c])
+            if distance[c] > newdist:
+                distance[c] = newdist
+                parent[c] = vi
+                buckets[newdist % nbuckets].append(c)
+                pending += 1
+
+    if stats is not None:
+        stats['settled'] = loops
+    return parent, distance
+
+#
+# A* search. Every step costs at least `min_risk` and moves one unit of
+# manhattan distance, so `min_risk * manhattan(c, end)` never
+# overestimates the remaining cost and is consistent. The heap is
+# ordered by estimated total cost rather than by distance so far, which
+# steers the search towards `end`, and we stop as soon as `end` is
+# settled. Consequently only the settled part of `distance` is exact:
+# the rest holds tentative values or maxint. Ties on the estimate are
+# broken in favour of the larger distance so far (hence the negated
+# distance in the heap entries), i.e. the node closest to `end`.
+#
+
+def astar(costs, start, end, stats=None):
+    nrow, ncol = costs.shape
+    print(f'astar: {costs.shape = } {start = } {end = }')
+    maxint = np.iinfo(np.int32).max
+    min_risk = int(costs.min())
+
+    def estimate(c):
+        return min_risk * manhattan(c, end)
+
+    intree = grid_full(costs, 0, np.bool8)
+    distance = grid_full(costs, maxint, np.int32)
+    parent = grid_full(costs, NO_PARENT, index_dtype(costs))
+
+    timer = StopWatch()
+    distance[start] = 0
+    fringe = [(estimate(start), 0, start)]
+
+    every = 2500
+    loops = 0
+
+    while fringe:
+        _, negdist, v = hq.heappop(fringe)
+        dist = -negdist
+        if intree[v]:
+            continue
+
+        loops += 1
+        if loops % every == 0:
+            progress('' if v != end else 'end!', loops, v, distance, timer)
+
+        intree[v] = True
+        if v == end:
+            break
+
+        vi = v[0] * ncol + v[1]
+        for c in neighbours(costs, *v):
+            if intree[c]:
+                continue
+            newdist = dist + int(costs[c])
+            if distance[c] > newdist:
+                distance[c] = newdist
+                parent[c] = vi
+                hq.heappush(fringe, (newdist + estimate(c), -newdist, c))
+
+    if stats is not None:
+        stats['settled'] = loops
+    return parent, distance
+
+#
+# Bidirectional dijkstra. One search grows forwards from `start` and
+# another backwards from `end`; in the backward search stepping from u
+# to a neighbour w costs costs[u], since that's what the forward move
+# w -> u would cost. Whenever an edge joins the two searches we have a
+# candidate path, and once the two fringe minimums together reach the
+# best candidate no shorter path can exist, so we stop.
+#
+# As with A*, only part of `distance` is exact: the nodes settled by
+# the forward search, plus the backward half of the best path, which is
+# spliced onto the forward tree so `parent` leads from `end` to
+# `start`.
+#
+
+def bidirectional(costs, start, end, stats=None):
+    nrow, ncol = costs.shape
+    print(f'bidirectional: {costs.shape = } {start = } {end = }')
+    maxint = np.iinfo(np.int32).max
+
+    # index 0 is the forward search, index 1 the backward one
+    intree = [ grid_full(costs, 0, np.bool8) for _ in range(2) ]
+    distance = [ grid_full(costs, maxint, np.int32) for _ in range(2) ]
+    parent = [ grid_full(costs, NO_PARENT, index_dtype(costs)) for _ in range(2) ]
+    fringe = [ [(0, start)], [(0, end)] ]
+    distance[0][start] = 0
+    distance[1][end] = 0
+
+    timer = StopWatch()
+    best, meet = (0, start) if start == end else (maxint, None)
+
+    every = 2500
+    loops = 0
+
+    while fringe[0] and fringe[1]:
+        if fringe[0][0][0] + fringe[1][0][0] >= best:
+            break
+
+        side = 0 if fringe[0][0][0] <= fringe[1][0][0] else 1
+        dist, v = hq.heappop(fringe[side])
+        if intree[side][v]:
+            continue
+
+        loops += 1
+        if loops % every == 0:
+            progress('' if v != end else 'end!', loops, v, distance[0], timer)
+
+        intree[side][v] = True
+        vi = v[0] * ncol + v[1]
+        step = 0 if side == 0 else int(costs[v])
+        for c in neighbours(costs, *v):
+            if intree[side][c]:
+                continue
+            newdist = dist + (int(costs[c]) if side == 0 else step)
+            if distance[side][c] > newdist:
+                distance[side][c] = newdist
+                parent[side][c] = vi
+                hq.heappush(fringe[side], (newdist, c))
+            other = distance[1 - side][c]
+            if other != maxint and distance[side][c] + other < best:
+                best, meet = distance[side][c] + other, c
+
+    # splice the backward half of the best path onto the forward tree
+    fparent, fdistance = parent[0], distance[0]
+    if meet is not None:
+        links = parent[1].ravel()
+        endi = end[0] * ncol + end[1]
+        m, mi = meet, meet[0] * ncol + meet[1]
+        while mi != endi:
+            ni = int(links[mi])
+            n = divmod(ni, ncol)
+            fparent[n] = mi
+            fdistance[n] = fdistance[m] + costs[n]
+            m, mi = n, ni
+        assert fdistance[end] == best
+
+    if stats is not None:
+        stats['settled'] = loops
+    return fparent, fdistance
+
+#
+# A pure numpy engine with no priority queue at all. Instead of
+# settling one node at a time, it repeatedly relaxes every cell against
+# its neighbours until nothing changes (Bellman-Ford style). A single
+# sweep in one direction is a prefix-min: moving down a column,
+#
+#   d[i] = min(d[i], d[i-1] + c[i])
+#        = S[i] + min over j <= i of (d[j] - S[j]),  S = cumsum(c)
+#
+# which `np.minimum.accumulate` does for every column at once. Each
+# round sweeps down, up, right and left, so it only needs roughly as
+# many rounds as the best paths have changes of direction. Parents are
+# recovered at the end from whichever neighbour accounts for each
+# cell's final distance.
+#
+
+def relaxation_sweep(costs, start, end, stats=None):
+    nrow, ncol = costs.shape
+    print(f'relaxation_sweep: {costs.shape = } {start = }')
+    maxint = np.iinfo(np.int32).max
+
+    c = np.asarray(costs, dtype=np.int64)
+    inf = np.int64(c.sum() + 1)
+    d = np.full(costs.shape, fill_value=inf, dtype=np.int64)
+    d[start] = 0
+
+    # the cost of entering each cell, accumulated along each axis in
+    # each direction. these don't change, so work them out up front.
+    forward = [ np.cumsum(c, axis=axis) for axis in (0, 1) ]
+    backward = [
+        np.flip(np.cumsum(np.flip(c, axis), axis=axis), axis)
+        for axis in (0, 1)
+    ]
+
+    def sweep(d, axis):
+        s = forward[axis]
+        d = s + np.minimum.accumulate(d - s, axis=axis)
+        s = np.flip(backward[axis], axis)
+        d = np.flip(d, axis)
+        d = s + np.minimum.accumulate(d - s, axis=axis)
+        return np.flip(d, axis)
+
+    timer = StopWatch()
+    sweeps = 0
+    changed = True
+    while changed:
+        sweeps += 1
+        before = d
+        for axis in (0, 1):
+            d = sweep(d, axis)
+        changed = not np.array_equal(before, d)
+
+    print(f'... {timer.lap():.3f} sweeps {sweeps}')
+
+    # each cell's parent is the neighbour with the smallest distance;
+    # pad with `inf` so cells on the border never pick the outside.
+    padded = np.pad(d, 1, constant_values=inf)
+    shifts = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    around = np.stack([
+        padded[1 + dr : 1 + dr + nrow, 1 + dc : 1 + dc + ncol]
+        for dr, dc in shifts
+    ])
+    best = np.argmin(around, axis=0)
+    rows, cols = np.indices(costs.shape)
+    drow = np.array([dr for dr, _ in shifts])[best]
+    dcol = np.array([dc for _, dc in shifts])[best]
+    parent = ((rows + drow) * ncol + (cols + dcol)).astype(index_dtype(costs))
+    parent[d >= inf] = NO_PARENT
+    parent[start] = NO_PARENT
+
+    distance = np.where(d >= inf, maxint, d).astype(np.int32)
+    if stats is not None:
+        stats['settled'] = int(np.count_nonzero(d < inf))
+        stats['sweeps'] = sweeps
+    return parent, distance
+
+ENGINES = {
+    'argmin': dijkstra,
+    'heap': dijkstra_heap,
+    'dial': dijkstra_dial,
+    'astar': astar,
+    'bidir': bidirectional,
+    'sweep': relaxation_sweep,
+}
+
+def find_safest(costs, start, end, engine='heap', stats=None):
+    parent, dist = ENGINES[engine](costs, start, end, stats)
     return dist[end]
 
-def part1(fname: str):
+def report_settled(engine, settled, total):
+    print(f'{engine}: settled {settled} of {total} nodes ({settled / total:.1%})')
+
+class IncrementalSafest:
+    """
+    The least-risk distance from `start` to every cell of a cave, kept
+    up to date as individual cell risks change. Rather than rerunning
+    dijkstra over the whole grid, `update_cost` repairs just the part
+    of the shortest-path tree that the edit can affect:
+
+    - if a cell gets cheaper, only paths that can now go through it
+      improve, so we lower its distance and let dijkstra propagate the
+      improvement outwards from there;
+
+    - if a cell gets dearer, only the cells whose current best path goes
+      through it (its subtree in `parent`) can be affected. We forget
+      their distances, reseed each from its unaffected neighbours, and
+      run dijkstra over just that region.
+
+    This is the same idea as LPA*/D* Lite, without the goal-directed
+    part since we maintain the distance to every cell.
+    """
+    def __init__(self, costs, start: Coord):
+        self._costs = np.array(costs, dtype=np.int32)
+        self._start = start
+        self._maxint = np.iinfo(np.int32).max
+        self._parent, self._distance = dijkstra_heap(self._costs, start, None)
+
+    def distance(self) -> np.ndarray:
+        return self._distance
+    def parent(self) -> np.ndarray:
+        return self._parent
+    def costs(self) -> np.ndarray:
+        return self._costs
+
+    def update_cost(self, coord: Coord, new: int) -> int:
+        """
+        Set the risk of `coord` to `new` and repair the distance field.
+        Returns the number of cells whose distance was recomputed.
+        """
+        old = int(self._costs[coord])
+        self._costs[coord] = new
+        if new == old or coord == self._start:
+            # the risk of the start cell is never counted
+            return 0
+        elif new < old:
+            return self._decrease(coord)
+        else:
+            return self._increase(coord)
+
+    def _index(self, coord: Coord) -> int:
+        return coord[0] * self._costs.shape[1] + coord[1]
+
+    def _best_neighbour(self, coord: Coord, exclude=None):
+        best, via = self._maxint, None
+        for n in neighbours(self._costs, *coord):
+            if exclude is not None and n in exclude:
+                continue
+            if self._distance[n] == self._maxint:
+                continue
+            dist = int(self._distance[n]) + int(self._costs[coord])
+            if dist < best:
+                best, via = dist, n
+        return best, via
+
+    def _decrease(self, coord: Coord) -> int:
+        best, via = self._best_neighbour(coord)
+        if best >= self._distance[coord]:
+            return 0
+        self._distance[coord] = best
+        self._parent[coord] = self._index(via)
+        return self._propagate([(best, coord)])
+
+    def _increase(self, coord: Coord) -> int:
+        # collect the subtree hanging off `coord`. it's kept as a set
+        # rather than a grid-sized mask so that the work stays
+        # proportional to the subtree.
+        affected = { coord }
+        stack = [coord]
+        region = []
+        while stack:
+            v = stack.pop()
+            region.append(v)
+            vi = self._index(v)
+            for c in neighbours(self._costs, *v):
+                if c not in affected and self._parent[c] == vi:
+                    affected.add(c)
+                    stack.append(c)
+
+        for v in region:
+            self._distance[v] = self._maxint
+            self._parent[v] = NO_PARENT
+
+        fringe = []
+        for v in region:
+            best, via = self._best_neighbour(v, exclude=affected)
+            if via is not None:
+                self._distance[v] = best
+                self._parent[v] = self._index(via)
+                fringe.append((best, v))
+        hq.heapify(fringe)
+        self._propagate(fringe)
+        return len(region)
+
+    def _propagate(self, fringe) -> int:
+        settled = 0
+        while fringe:
+            dist, v = hq.heappop(fringe)
+            if dist > self._distance[v]:
+                continue    # stale entry
+            settled += 1
+            vi = self._index(v)
+            for c in neighbours(self._costs, *v):
+                newdist = dist + int(self._costs[c])
+                if self._distance[c] > newdist:
+                    self._distance[c] = newdist
+                    self._parent[c] = vi
+                    hq.heappush(fringe, (newdist, c))
+        return settled
+
+def part1(fname: str, engine: str = 'heap'):
     print("=" * 10, "part 1")
     grid = read_input(fname)
     nrow, ncol = grid.shape
 
-    best = find_safest(grid, (0, 0), (nrow - 1, ncol - 1))
+    stats = {}
+    best = find_safest(grid, (0, 0), (nrow - 1, ncol - 1), engine, stats)
+    report_settled(engine, stats['settled'], grid.size)
     print(f'part1: {best}')
 
 def expand_grid(grid, factor):
@@ -201,17 +744,261 @@ def expand_grid(grid, factor):
     
     return newgrid
 
-def part2(fname: str):
+class TiledGrid:
+    """
+    A read-only view of `expand_grid(base, factor)` that computes each
+    cell on demand instead of materialising the expanded array. Only
+    the base tile is stored, so the tiling factor costs no extra memory.
+    Supports just enough of the ndarray interface (`shape`, `dtype`,
+    indexing by coordinate, `min`, `max`) for `neighbours` and the
+    dijkstra engines.
+    """
+    def __init__(self, base: np.ndarray, factor: int):
+        self._base = base
+        self._factor = factor
+        nrow, ncol = base.shape
+        self.shape = (nrow * factor, ncol * factor)
+        self.dtype = base.dtype
+    @property
+    def filename(self) -> ty.Optional[str]:
+        # the file behind the base tile, if it's memory-mapped
+        return getattr(self._base, 'filename', None)
+    def __getitem__(self, coord: Coord) -> int:
+        r, c = coord
+        n, m = self._base.shape
+        risk = int(self._base[r % n, c % m]) + r // n + c // m
+        return (risk - 1) % 9 + 1
+    def _shifted(self) -> ty.Iterable[np.ndarray]:
+        # tile (b, c) is the base shifted by b + c, and shifts
+        # repeat with period 9, so there's no need to look further.
+        for shift in range(min(2 * self._factor - 1, 9)):
+            yield (self._base + shift - 1) % 9 + 1
+    def min(self) -> int:
+        return min(int(t.min()) for t in self._shifted())
+    def max(self) -> int:
+        return max(int(t.max()) for t in self._shifted())
+    def __array__(self, dtype=None):
+        nrow, ncol = self.shape
+        n, m = self._base.shape
+        r = np.arange(nrow)
+        c = np.arange(ncol)
+        risk = (
+            np.tile(self._base, (self._factor, self._factor))
+            + (r // n)[:, None]
+            + (c // m)[None, :]
+        )
+        return ((risk - 1) % 9 + 1).astype(dtype or self.dtype)
+
+def part2(fname: str, engine: str = 'heap'):
     print("=" * 10, "part 2")
 
     grid = read_input(fname)
-    expanded = expand_grid(grid, 5)
+    expanded = TiledGrid(grid, 5)
     # print(expanded)
     nrow, ncol = expanded.shape
 
-    best = find_safest(expanded, (0, 0), (nrow - 1, ncol - 1))
+    stats = {}
+    best = find_safest(expanded, (0, 0), (nrow - 1, ncol - 1), engine, stats)
+    report_settled(engine, stats['settled'], nrow * ncol)
     print(f'part2: {best}')
 
+# the argmin engine is quadratic in the number of cells, so don't
+# bother running it past this size.
+BENCH_LIMITS = {
+    'argmin': 300,
+}
+
+def random_grid(n: int, seed: int = 15):
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, 10, size=(n, n), dtype=np.int32)
+
+def benchmark(
+    sizes=(100, 500, 1000, 2000, 5000),
+    engines=None,
+    seed: int = 15
+):
+    engines = engines or list(ENGINES)
+    print("=" * 10, "benchmark")
+    for n in sizes:
+        grid = random_grid(n, seed)
+        best = {}
+        for engine in engines:
+            if n > BENCH_LIMITS.get(engine, n):
+                print(f'{n:>5}x{n:<5} {engine:>8}  skipped')
+                continue
+            stats = {}
+            timer = StopWatch()
+            with open(os.devnull, 'w') as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    best[engine] = find_safest(
+                        grid, (0, 0), (n - 1, n - 1), engine, stats)
+            print(" ".join([
+                f'{n:>5}x{n:<5} {engine:>8} {timer.elapsed():9.3f}s',
+                f'risk {best[engine]}',
+                f'settled {stats["settled"] / grid.size:6.1%}',
+            ] + ([f'sweeps {stats["sweeps"]}'] if 'sweeps' in stats else [])))
+        assert len(set(best.values())) <= 1, f'engines disagree: {best}'
+
 if __name__ == '__main__':
-    part1(sys.argv[1])
-    part2(sys.argv[1])
\ No newline at end of file
+    if sys.argv[1] == 'convert':
+        convert_input(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    if sys.argv[1] == 'bench':
+        sizes = tuple(map(int, sys.argv[2:])) or None
+        benchmark(*([sizes] if sizes else []))
+        sys.exit(0)
+    engine = sys.argv[2] if len(sys.argv) > 2 else 'heap'
+    part1(sys.argv[1], engine)
+    part2(sys.argv[1], engine)
+    sys.exit(0)
+
+TINY = [
+    "1163751742",
+    "1381373672",
+    "2136511328",
+    "3694931569",
+    "7463417111",
+    "1319128137",
+    "1359912421",
+    "3125421639",
+    "1293138521",
+    "2311944581",
+]
+
+def tiny_grid():
+    return np.array(
+        [ list(map(int, line)) for line in TINY ],
+        dtype=np.int32
+    )
+
+class EngineTests(unittest.TestCase):
+    def test_engines_agree(self):
+        grid = tiny_grid()
+        expanded = expand_grid(grid, 5)
+        for engine in ENGINES:
+            self.assertEqual(40, find_safest(grid, (0, 0), (9, 9), engine), engine)
+            self.assertEqual(315, find_safest(expanded, (0, 0), (49, 49), engine), engine)
+    def test_astar_settles_fewer_nodes(self):
+        grid = np.ones((50, 50), dtype=np.int32)
+        grid[10:40, 10:40] = 9
+        settled = {}
+        for engine in ['heap', 'astar']:
+            stats = {}
+            risk = find_safest(grid, (0, 0), (49, 49), engine, stats)
+            self.assertEqual(98, risk, engine)
+            settled[engine] = stats['settled']
+        self.assertEqual(grid.size, settled['heap'])
+        self.assertLess(settled['astar'], grid.size // 4)
+    def test_bidirectional_stops_early(self):
+        grid = expand_grid(tiny_grid(), 5)
+        stats = {}
+        self.assertEqual(315, find_safest(grid, (0, 0), (49, 49), 'bidir', stats))
+        self.assertLess(stats['settled'], grid.size)
+        for end in [(0, 0), (0, 1), (49, 0), (17, 23)]:
+            _, distance = dijkstra_heap(grid, (0, 0), end)
+            self.assertEqual(distance[end], find_safest(grid, (0, 0), end, 'bidir'), end)
+    def test_reconstruct_path(self):
+        grid = expand_grid(tiny_grid(), 5)
+        for engine in ENGINES:
+            parent, distance = ENGINES[engine](grid, (0, 0), (49, 49))
+            self.assertEqual(np.int32, parent.dtype)
+            path = reconstruct_path(parent, (49, 49))
+            self.assertEqual((0, 0), tuple(path[0]))
+            self.assertEqual((49, 49), tuple(path[-1]))
+            steps = np.abs(np.diff(path, axis=0)).sum(axis=1)
+            self.assertTrue(np.all(steps == 1), engine)
+            risk = grid[path[1:, 0], path[1:, 1]].sum()
+            self.assertEqual(distance[49, 49], risk, engine)
+
+    def test_parent_indices_fit(self):
+        self.assertEqual(np.int32, index_dtype(tiny_grid()))
+        # 50000 x 50000 cells, without allocating any of them
+        huge = TiledGrid(tiny_grid(), 5000)
+        self.assertGreater(math.prod(huge.shape), np.iinfo(np.int32).max)
+        self.assertEqual(np.int64, index_dtype(huge))
+
+class TiledGridTests(unittest.TestCase):
+    def test_matches_expand_grid(self):
+        grid = tiny_grid()
+        for factor in (1, 2, 5, 7):
+            tiled = TiledGrid(grid, factor)
+            expanded = expand_grid(grid, factor)
+            self.assertEqual(expanded.shape, tiled.shape)
+            self.assertTrue(np.array_equal(expanded, np.asarray(tiled)))
+            self.assertEqual(expanded.max(), tiled.max())
+            self.assertEqual(expanded.min(), tiled.min())
+            nrow, ncol = tiled.shape
+            for coord in [(0, 0), (9, 0), (0, 9), (nrow - 1, ncol - 1)]:
+                self.assertEqual(expanded[coord], tiled[coord])
+    def test_engines_on_tiled_grid(self):
+        tiled = TiledGrid(tiny_grid(), 5)
+        for engine in ENGINES:
+            self.assertEqual(315, find_safest(tiled, (0, 0), (49, 49), engine), engine)
+
+class IncrementalSafestTests(unittest.TestCase):
+    def test_matches_full_recompute(self):
+        grid = random_grid(40, seed=8)
+        inc = IncrementalSafest(grid, (0, 0))
+        rng = np.random.default_rng(8)
+        for _ in range(200):
+            coord = tuple(int(x) for x in rng.integers(0, 40, size=2))
+            new = int(rng.integers(1, 10))
+            inc.update_cost(coord, new)
+            grid[coord] = new
+        _, expected = dijkstra_heap(grid, (0, 0), None)
+        self.assertTrue(np.array_equal(expected, inc.distance()))
+        path = reconstruct_path(inc.parent(), (39, 39))
+        self.assertEqual((0, 0), tuple(path[0]))
+        risk = grid[path[1:, 0], path[1:, 1]].sum()
+        self.assertEqual(inc.distance()[39, 39], risk)
+    def test_small_edit_is_local(self):
+        grid = random_grid(100, seed=8)
+        inc = IncrementalSafest(grid, (0, 0))
+        repaired = inc.update_cost((99, 99), 1 + grid[99, 99] % 9)
+        self.assertLess(repaired, 10)
+    def test_interior_increase_is_local(self):
+        grid = random_grid(100, seed=8)
+        inc = IncrementalSafest(grid, (0, 0))
+        # a cell three quarters of the way along the best path to the
+        # far corner, so its subtree holds at least the rest of the path
+        path = reconstruct_path(inc.parent(), (99, 99))
+        coord = tuple(int(x) for x in path[3 * len(path) // 4])
+        repaired = inc.update_cost(coord, 9 + int(grid[coord]))
+        grid[coord] += 9
+        self.assertGreater(repaired, len(path) // 4)
+        self.assertLess(repaired, grid.size // 20)
+        _, expected = dijkstra_heap(grid, (0, 0), None)
+        self.assertTrue(np.array_equal(expected, inc.distance()))
+
+class MemmapTests(unittest.TestCase):
+    def test_convert_and_solve(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'tiny.txt')
+            npyname = os.path.join(tmp, 'tiny.npy')
+            with open(fname, 'w') as f:
+                f.write("\n".join(TINY) + "\n")
+            convert_input(fname, npyname)
+
+            grid = read_input(npyname)
+            self.assertIsInstance(grid, np.memmap)
+            self.assertTrue(np.array_equal(tiny_grid(), grid))
+            for engine in ['argmin', 'heap', 'dial', 'astar', 'bidir']:
+                parent, distance = ENGINES[engine](grid, (0, 0), (9, 9))
+                self.assertIsInstance(distance, np.memmap, engine)
+                self.assertEqual(40, distance[9, 9], engine)
+    def test_tiled_memmap_stays_on_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'tiny.txt')
+            npyname = os.path.join(tmp, 'tiny.npy')
+            with open(fname, 'w') as f:
+                f.write("\n".join(TINY) + "\n")
+            convert_input(fname, npyname)
+
+            tiled = TiledGrid(read_input(npyname), 5)
+            self.assertEqual(npyname, tiled.filename)
+            for engine in ['argmin', 'heap', 'dial', 'astar', 'bidir']:
+                parent, distance = ENGINES[engine](tiled, (0, 0), (49, 49))
+                self.assertIsInstance(parent, np.memmap, engine)
+                self.assertIsInstance(distance, np.memmap, engine)
+                self.assertEqual(315, distance[49, 49], engine)
+            self.assertIsNone(TiledGrid(tiny_grid(), 5).filename)
@@ -9,6 +9,16 @@ from itertools import islice, product
 import unittest
 import typing as ty
 import abc
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import resource
+from collections import Counter, defaultdict
+import os
+import time
+import contextlib
+import hashlib
+import tempfile
 
 np.seterr(all='raise')
 
@@ -123,11 +133,67 @@ class Cuboid:
             ')'
         ])
 
+def int_dtype(bound: int):
+    """
+    A dtype for sums and products up to `bound`: int64 if they fit,
+    python ints otherwise. numpy doesn't raise on integer overflow,
+    even under `np.seterr(all='raise')`, so it has to be checked up front.
+    """
+    return np.int64 if bound <= np.iinfo(np.int64).max else object
+
+# N cuboids as the rows (xmin, xmax, ymin, ymax, zmin, zmax) of an
+# int64 array, so that one cuboid can be tested against all of them in
+# a few numpy operations instead of a python loop over `Cuboid`s.
+class CuboidArray:
+    def __init__(self, bounds: ty.Optional[np.ndarray] = None):
+        if bounds is None:
+            bounds = np.empty((0, 6), dtype=np.int64)
+        self.bounds = np.asarray(bounds, dtype=np.int64).reshape(-1, 6)
+
+    @staticmethod
+    def row(cube: Cuboid) -> tuple[int, ...]:
+        return (
+            cube.xb.min, cube.xb.max,
+            cube.yb.min, cube.yb.max,
+            cube.zb.min, cube.zb.max,
+        )
+    @classmethod
+    def from_cuboids(cls, cubes: ty.Iterable[Cuboid]) -> 'CuboidArray':
+        return cls(np.array([ cls.row(c) for c in cubes ], dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+    def __getitem__(self, i) -> Cuboid:
+        return Cuboid.from_bounds(*map(int, self.bounds[i]))
+    def __iter__(self) -> ty.Iterator[Cuboid]:
+        for row in self.bounds.tolist():
+            yield Cuboid.from_bounds(*row)
+
+    def lengths(self) -> np.ndarray:
+        return self.bounds[:, 1::2] - self.bounds[:, 0::2] + 1
+    def volumes(self) -> np.ndarray:
+        # as python ints: the product can overflow int64 long before
+        # the coordinates themselves do.
+        return self.lengths().astype(object).prod(axis=1)
+
+    def intersect(self, cube: Cuboid) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Intersect `cube` with every cuboid in the array. Returns a mask
+        of the rows that overlap it, and the (N, 6) bounds of the
+        overlaps, which are only meaningful where the mask is set.
+        """
+        other = np.array(self.row(cube), dtype=np.int64)
+        overlap = np.empty_like(self.bounds)
+        np.maximum(self.bounds[:, 0::2], other[0::2], out=overlap[:, 0::2])
+        np.minimum(self.bounds[:, 1::2], other[1::2], out=overlap[:, 1::2])
+        mask = (overlap[:, 0::2] <= overlap[:, 1::2]).all(axis=1)
+        return mask, overlap
+
 class State(Enum):
     ON = 1
     OFF = 0
 
-def read_input(fname:str) -> list[tuple[State, Cuboid]]:
+def iter_input(fname: str) -> ty.Iterator[tuple[State, Cuboid]]:
     state = {
         "on": State.ON,
         "off": State.OFF,
@@ -144,7 +210,12 @@ def read_input(fname:str) -> list[tuple[State, Cuboid]]:
         return (state[toggle], Cuboid(xbounds, ybounds, zbounds))
 
     with open(fname) as f:
-        return [ decode_line(line) for line in f ]
+        for line in f:
+            if line.strip():
+                yield decode_line(line)
+
+def read_input(fname:str) -> list[tuple[State, Cuboid]]:
+    return list(iter_input(fname))
 
 class CubeTree(abc.ABC):
     @abc.abstractmethod
@@ -168,6 +239,34 @@ class CubeTree(abc.ABC):
     @abc.abstractmethod
     def nodecount(self) -> int: ...
 
+    @abc.abstractmethod
+    def lit_count(self, region: Cuboid) -> int: ...
+
+    @abc.abstractmethod
+    def lit_counts(self, regions: np.ndarray) -> np.ndarray:
+        """
+        Lit cube counts for each of an (N, 6) array of regions, each row
+        laid out as (xmin, xmax, ymin, ymax, zmin, zmax) like
+        `Cuboid.from_bounds`.
+        """
+
+    def _clip(self, regions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # the regions clipped to this box, and a mask of the ones that
+        # overlap it at all
+        box = np.array(CuboidArray.row(self.box()), dtype=np.int64)
+        regions = np.asarray(regions, dtype=np.int64).reshape(-1, 6)
+        clipped = np.empty_like(regions)
+        np.maximum(regions[:, 0::2], box[0::2], out=clipped[:, 0::2])
+        np.minimum(regions[:, 1::2], box[1::2], out=clipped[:, 1::2])
+        return clipped, (clipped[:, 0::2] <= clipped[:, 1::2]).all(axis=1)
+
+    def _zeros(self, n: int) -> np.ndarray:
+        return np.zeros(n, dtype=int_dtype(self.box().volume()))
+
+    def _volumes(self, regions: np.ndarray) -> np.ndarray:
+        sides = regions[:, 1::2] - regions[:, 0::2] + 1
+        return sides.astype(int_dtype(self.box().volume())).prod(axis=1)
+
 class CubeLeaf(CubeTree):
     _ALL_ON, _ALL_OFF, _MAT = range(3)
 
@@ -217,11 +316,14 @@ class CubeLeaf(CubeTree):
             self._state = None
             self._update_mat(region, state)
         elif not whole_box and not using_mat:
+            # the padding bits at the end of each z row are never
+            # counted, so it doesn't matter what they're set to.
+            nx, ny, nz = self._box.shape()
             self._mat = np.full(
-                self._box.shape(),
-                dtype=np.bool8,
-                fill_value=self._state.value,
-            ) 
+                (nx, ny, (nz + 7) // 8),
+                dtype=np.uint8,
+                fill_value=0xff if self._state == State.ON else 0,
+            )
             self._state = None
             self._update_mat(region, state)
         else:
@@ -230,22 +332,90 @@ class CubeLeaf(CubeTree):
         self._update_oncount()
         self._concheck()
 
+    # the number of bits set in each possible byte
+    _POPCOUNT = np.array([ bin(b).count('1') for b in range(256) ], dtype=np.int64)
+
+    def lit_count(self, region: Cuboid) -> int:
+        self._concheck()
+        overlap = self._box.intersection(region)
+        if not overlap:
+            return 0
+        if self._state is not None:
+            return overlap.volume() * self._state.value
+        sub, mask = self._submatrix(overlap)
+        return int(self._POPCOUNT[sub & mask].sum())
+
+    def lit_counts(self, regions: np.ndarray) -> np.ndarray:
+        self._concheck()
+        clipped, hit = self._clip(regions)
+        counts = self._zeros(len(clipped))
+        if self._state is not None:
+            counts[hit] = self._volumes(clipped[hit]) * self._state.value
+            return counts
+
+        # popcount each query's part of the matrix, unless between them
+        # they'd read more of it than building a prefix-sum table of the
+        # unpacked matrix would, which then answers every query with the
+        # usual eight-corner inclusion-exclusion.
+        if 8 * self._volumes(clipped[hit]).sum() < self._box.volume():
+            for i in np.flatnonzero(hit):
+                sub, mask = self._submatrix(Cuboid.from_bounds(*map(int, clipped[i])))
+                counts[i] = int(self._POPCOUNT[sub & mask].sum())
+            return counts
+        nx, ny, nz = self._box.shape()
+        prefix = np.zeros((nx + 1, ny + 1, nz + 1), dtype=np.int64)
+        prefix[1:, 1:, 1:] = np.unpackbits(
+            self._mat, axis=2, count=nz
+        ).cumsum(axis=0, dtype=np.int64).cumsum(axis=1).cumsum(axis=2)
+        origin = np.array([ b.min for b in (self._box.xb, self._box.yb, self._box.zb) ])
+        lo = clipped[hit, 0::2] - origin
+        hi = clipped[hit, 1::2] - origin + 1
+        for corner in product((0, 1), repeat=3):
+            sign = -1 if (3 - sum(corner)) % 2 else 1
+            counts[hit] += sign * prefix[
+                tuple( (lo, hi)[c][:, axis] for axis, c in enumerate(corner) )
+            ]
+        return counts
+
     def _update_mat(self, region: Cuboid, state: State):
+        sub, mask = self._submatrix(region)
+        was_on = int(self._POPCOUNT[sub & mask].sum())
+        if state == State.ON:
+            sub |= mask
+            self._oncount += region.volume() - was_on
+        else:
+            sub &= ~mask
+            self._oncount -= was_on
+
+    def _submatrix(self, region: Cuboid) -> tuple[np.ndarray, np.ndarray]:
+        # the matrix is bit-packed along z (as by `np.packbits`), so a z
+        # range turns into a mask of bits within each row of bytes.
         imin = region.xb.min - self._box.xb.min
         imax = region.xb.max - self._box.xb.min + 1
         jmin = region.yb.min - self._box.yb.min
         jmax = region.yb.max - self._box.yb.min + 1
         kmin = region.zb.min - self._box.zb.min
         kmax = region.zb.max - self._box.zb.min + 1
-        self._mat[imin : imax, jmin : jmax, kmin : kmax ] = state.value
+
+        zbits = np.zeros(self._mat.shape[2] * 8, dtype=np.bool8)
+        zbits[kmin:kmax] = True
+        mask = np.packbits(zbits)
+        bmin, bmax = kmin // 8, (kmax + 7) // 8
+        mask = mask[bmin:bmax]
+
+        return self._mat[imin : imax, jmin : jmax, bmin : bmax], mask
 
     def _update_oncount(self):
+        # while the matrix is in use the count is kept up to date by
+        # `_update_mat`; otherwise it follows from the state. a matrix
+        # that has become uniform is dropped.
+        if self._state is None and self._oncount in (0, self._box.volume()):
+            self._state = State.ON if self._oncount else State.OFF
+            self._mat = None
         if self._state == State.ON:
             self._oncount = self._box.volume()
         elif self._state == State.OFF:
             self._oncount = 0
-        elif self._state is None:
-            self._oncount = int(np.sum(self._mat, dtype=np.int32))
 
 def part1(fname: str):
     core = CubeLeaf(
@@ -271,6 +441,13 @@ class CubeNode(CubeTree):
         self._child_boxes: np.ndarray = None
         self._child_grid: np.ndarray = None
 
+        # tree statistics, cached so that asking for them doesn't
+        # walk the whole tree. they only change along the path that
+        # `set` takes, and are recomputed there from the children's.
+        self._nodecount = 1
+        self._minheight = 1
+        self._maxheight = 1
+
     def set(self, region: Cuboid, state: State):
         assert self._box.contains(region)
 
@@ -279,6 +456,7 @@ class CubeNode(CubeTree):
         elif self._box == region and self._expanded:
             self._discard_children()
             self._oncount = [0, self._box.volume()][state.value]
+            self._update_stats()
         elif self._box != region and not self._expanded:
             self._expand_children(region)
             self._update_children(region, state)
@@ -291,6 +469,19 @@ class CubeNode(CubeTree):
     
     def _update_counts(self):
         self._oncount = sum(c.on_count() for c in self._child_grid.ravel())
+        if self._oncount in (0, self._box.volume()):
+            # every cube below here is in the same state, so the
+            # children aren't telling us anything any more.
+            self._discard_children()
+        self._update_stats()
+    def _update_stats(self):
+        if not self._expanded:
+            self._nodecount = self._minheight = self._maxheight = 1
+            return
+        children = self._child_grid.ravel()
+        self._nodecount = 1 + sum(c.nodecount() for c in children)
+        self._minheight = 1 + min(c.minheight() for c in children)
+        self._maxheight = 1 + max(c.maxheight() for c in children)
     def _discard_children(self):
         assert self._expanded
         self._child_boxes = None
@@ -315,6 +506,7 @@ class CubeNode(CubeTree):
             self._child_grid[i, j, k] = child
 
         self._expanded = True
+        self._update_stats()
 
     def _make_child(self, region, lit):
         min_side =  min(
@@ -339,17 +531,38 @@ class CubeNode(CubeTree):
     def box(self): return self._box
     def on_count(self): return self._oncount
     def off_count(self): return self._box.volume() - self._oncount
-    def nodecount(self):
-        if not self._expanded: return 1
-        return 1 + sum(c.nodecount() for c in self._child_grid.ravel())
-    def minheight(self):
+    def lit_count(self, region: Cuboid) -> int:
+        overlap = self._box.intersection(region)
+        if not overlap:
+            return 0
+        if overlap == self._box:
+            return self._oncount
         if not self._expanded:
-            return 1
-        return 1 + min(c.minheight() for c in self._child_grid.ravel())
-    def maxheight(self):
+            return overlap.volume() if self._oncount else 0
+        return sum(
+            c.lit_count(overlap) for c in self._child_grid.ravel()
+        )
+    def lit_counts(self, regions: np.ndarray) -> np.ndarray:
+        # the same walk as `lit_count`, for every region at once: only
+        # the regions that cut through a node go on to its children.
+        clipped, hit = self._clip(regions)
+        counts = self._zeros(len(clipped))
         if not self._expanded:
-            return 1
-        return 1 + max(c.maxheight() for c in self._child_grid.ravel())
+            if self._oncount:
+                counts[hit] = self._volumes(clipped[hit])
+            return counts
+        box = np.array(CuboidArray.row(self._box), dtype=np.int64)
+        whole = hit & (clipped == box).all(axis=1)
+        counts[whole] = self._oncount
+        part = np.flatnonzero(hit & ~whole)
+        if len(part):
+            counts[part] = sum(
+                c.lit_counts(clipped[part]) for c in self._child_grid.ravel()
+            )
+        return counts
+    def nodecount(self): return self._nodecount
+    def minheight(self): return self._minheight
+    def maxheight(self): return self._maxheight
     def visit(self, visitor, depth=0):
         visitor('before node', self, depth)
         if self._expanded:
@@ -359,8 +572,15 @@ class CubeNode(CubeTree):
 
 def flip(f): return lambda *args: f(*reversed(args))
 
-def part2(fname: str):
-    instrs = read_input(fname)
+# Each engine takes the reboot steps and returns how many cubes end up
+# lit. Given a `stats` dict, it also records in stats['nodes'] the size
+# of the structure it built: tree nodes, grid cells, signed cuboids or
+# the cells of the largest sweep grid.
+
+def lit_octree(
+    instrs: list[tuple[State, Cuboid]],
+    stats: ty.Optional[dict] = None,
+) -> int:
     cuboid = reduce(
         lambda c1, c2: c1.extend_to(c2),
         (inst[1] for inst in instrs))
@@ -391,14 +611,713 @@ def part2(fname: str):
         nc = node.nodecount()
         print(f'step {i} {nc = } {minh = } {maxh = } {toggle = } {cube = }')
         node.set(cube, toggle)
-        
 
-    print(f'part 2: total lit {node.on_count()}')
-    return 
+    if stats is not None:
+        stats['nodes'] = node.nodecount()
+    return node.on_count()
+
+#
+# Coordinate compression. Only the coordinates where some cuboid starts
+# or ends matter: between two consecutive boundaries on an axis, every
+# cube is lit or unlit by exactly the same steps. So we cut each axis at
+# every `min` and `max + 1`, giving a grid of at most 2n cells per axis
+# for n steps, run the steps as slice assignments on a boolean grid of
+# those cells, and weight each lit cell by its real volume at the end.
+#
+
+class CompressedGrid:
+    def __init__(self, cuboids: ty.Iterable[Cuboid]):
+        cuboids = list(cuboids)
+        def cuts(axis: str) -> np.ndarray:
+            bounds = [ getattr(c, axis) for c in cuboids ]
+            return np.array(sorted(
+                {b.min for b in bounds} | {b.max + 1 for b in bounds}
+            ), dtype=np.int64)
+        self._cuts = [ cuts('xb'), cuts('yb'), cuts('zb') ]
+        # no cuboids means no cuts at all, not one fewer cell than cuts
+        self._lit = np.zeros(
+            [ max(len(c) - 1, 0) for c in self._cuts ],
+            dtype=np.bool8
+        )
+
+    def shape(self):
+        return self._lit.shape
+
+    def _slices(self, cube: Cuboid) -> tuple[slice, slice, slice]:
+        return tuple(
+            slice(
+                int(np.searchsorted(cuts, b.min)),
+                int(np.searchsorted(cuts, b.max + 1)),
+            )
+            for cuts, b in zip(self._cuts, (cube.xb, cube.yb, cube.zb))
+        )
+
+    def set(self, region: Cuboid, state: State):
+        self._lit[self._slices(region)] = state.value
+
+    def on_count(self) -> int:
+        dx, dy, dz = ( np.diff(cuts) for cuts in self._cuts )
+        # one x slab at a time, so we never build a full-size int64
+        # copy of the grid.
+        dtype = int_dtype(int(dy.sum()) * int(dz.sum()))
+        area = np.outer(dy.astype(dtype), dz.astype(dtype))
+        return sum(
+            int(dx[i]) * int(area[self._lit[i]].sum())
+            for i in range(len(dx))
+        )
+
+
+def reboot_compressed(instrs: list[tuple[State, Cuboid]]) -> CompressedGrid:
+    grid = CompressedGrid(cube for _, cube in instrs)
+    print('compressed grid', grid.shape())
+    for toggle, cube in instrs:
+        grid.set(cube, toggle)
+    return grid
+
+def lit_compressed(
+    instrs: list[tuple[State, Cuboid]],
+    stats: ty.Optional[dict] = None,
+) -> int:
+    grid = reboot_compressed(instrs)
+    if stats is not None:
+        stats['nodes'] = int(np.prod(grid.shape()))
+    return grid.on_count()
+
+#
+# Inclusion-exclusion. Keep a multiset of cuboids with integer weights
+# whose weighted volumes add up to the lit count. Each new step first
+# cancels whatever is already counted inside it, by adding every
+# existing entry's intersection with it at the opposite weight, and an
+# "on" step then adds the cuboid itself. Nothing depends on the size
+# of the coordinates, only on how many overlaps there are.
+#
+
+class SignedCuboids:
+    # entries live in the first `_size` rows of `_bounds`, grown by
+    # doubling; `_slots` finds an entry's row from its bounds. An entry
+    # whose weight drops to zero keeps its row until enough of them
+    # have piled up to be worth compacting.
+    def __init__(self):
+        self._bounds = np.empty((16, 6), dtype=np.int64)
+        self._weights = np.zeros(16, dtype=np.int64)
+        self._size = 0
+        self._slots: dict[tuple[int, ...], int] = {}
+        self._steps = 0
+        self._inputs = ''
+
+    def steps(self) -> int:
+        return self._steps
+    def inputs(self) -> str:
+        """What the snapshot this was loaded from says it was built from."""
+        return self._inputs
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def cubes(self) -> tuple[CuboidArray, np.ndarray]:
+        """The entries with non-zero weight, and their weights."""
+        live = self._weights[:self._size] != 0
+        return CuboidArray(self._bounds[:self._size][live]), self._weights[:self._size][live]
+
+    def set(self, region: Cuboid, state: State):
+        n = self._size
+        mask, overlap = CuboidArray(self._bounds[:n]).intersect(region)
+        hits = np.flatnonzero(mask & (self._weights[:n] != 0))
+
+        update: Counter[tuple[int, ...]] = Counter()
+        for row, weight in zip(overlap[hits].tolist(), self._weights[hits].tolist()):
+            update[tuple(row)] -= weight
+        if state == State.ON:
+            update[CuboidArray.row(region)] += 1
+        for row, weight in update.items():
+            if weight:
+                self._add(row, weight)
+        if 2 * len(self._slots) < self._size:
+            self._compact()
+        self._steps += 1
+
+    def _add(self, row: tuple[int, ...], weight: int):
+        slot = self._slots.get(row)
+        if slot is None:
+            if self._size == len(self._weights):
+                self._resize(2 * self._size)
+            slot = self._size
+            self._size += 1
+            self._bounds[slot] = row
+            self._slots[row] = slot
+        self._weights[slot] += weight
+        if self._weights[slot] == 0:
+            del self._slots[row]
+
+    def _resize(self, capacity: int):
+        bounds = np.empty((capacity, 6), dtype=np.int64)
+        weights = np.zeros(capacity, dtype=np.int64)
+        bounds[:self._size] = self._bounds[:self._size]
+        weights[:self._size] = self._weights[:self._size]
+        self._bounds, self._weights = bounds, weights
+
+    def _compact(self):
+        cubes, weights = self.cubes()
+        self._size = len(cubes)
+        self._bounds[:self._size] = cubes.bounds
+        self._weights[:] = 0
+        self._weights[:self._size] = weights
+        self._slots = {
+            tuple(row): i for i, row in enumerate(cubes.bounds.tolist())
+        }
+
+    def on_count(self) -> int:
+        cubes, weights = self.cubes()
+        return int((cubes.volumes() * weights.astype(object)).sum())
+
+    # region queries. the lit volume inside a region is the weighted sum
+    # of each entry's overlap with it, so a batch of queries is just the
+    # entries intersected with each query in turn. that costs time in
+    # proportion to the number of entries, but no memory beyond them,
+    # however large the coordinates.
+
+    def lit_counts(self, regions: np.ndarray, chunk: int = 1 << 20) -> np.ndarray:
+        """
+        Lit cube counts for each of an (N, 6) array of regions, each row
+        laid out as (xmin, xmax, ymin, ymax, zmin, zmax) like
+        `Cuboid.from_bounds`. `chunk` bounds how many query-entry pairs
+        are worked on at once.
+        """
+        regions = np.asarray(regions, dtype=np.int64).reshape(-1, 6)
+        cubes, weights = self.cubes()
+        bounds = cubes.bounds
+        # no overlap is bigger than its entry, so if the entries' weighted
+        # volumes add up to something that fits in int64, so does every
+        # product and partial sum along the way.
+        dtype = int_dtype(int((cubes.volumes() * np.abs(weights)).sum()))
+        counts = np.zeros(len(regions), dtype=dtype)
+        if not len(bounds):
+            return counts
+        step = max(1, chunk // len(bounds))
+        for k in range(0, len(regions), step):
+            q = regions[k:k + step, None, :]
+            lo = np.maximum(bounds[None, :, 0::2], q[:, :, 0::2])
+            hi = np.minimum(bounds[None, :, 1::2], q[:, :, 1::2])
+            sides = np.maximum(hi - lo + 1, 0).astype(dtype)
+            counts[k:k + step] = (sides.prod(axis=2) * weights).sum(axis=1)
+        return counts
+
+    def lit_count(self, region: Cuboid) -> int:
+        return int(self.lit_counts([CuboidArray.row(region)])[0])
+
+    # snapshots are a plain .npz: the entries' bounds as an (N, 6)
+    # array, their weights, how many steps had been applied, and a
+    # string identifying those steps, so a resume can check it's being
+    # fed the same input.
+
+    def save(self, path: str, inputs: str = ''):
+        cubes, weights = self.cubes()
+        bounds = cubes.bounds
+        # write to the side and rename, so that a crash part way through
+        # leaves the previous snapshot intact.
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f, bounds=bounds, weights=weights, steps=self._steps,
+                inputs=inputs)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SignedCuboids':
+        state = cls()
+        with np.load(path) as data:
+            for row, weight in zip(data['bounds'].tolist(), data['weights'].tolist()):
+                state._add(tuple(row), weight)
+            state._steps = int(data['steps'])
+            # older snapshots don't record their input, so never match
+            state._inputs = str(data['inputs']) if 'inputs' in data else ''
+        return state
+
+def reboot_signed(instrs: ty.Iterable[tuple[State, Cuboid]]) -> SignedCuboids:
+    state = SignedCuboids()
+    for toggle, cube in instrs:
+        state.set(cube, toggle)
+    return state
+
+def lit_signed(
+    instrs: list[tuple[State, Cuboid]],
+    stats: ty.Optional[dict] = None,
+) -> int:
+    state = reboot_signed(instrs)
+    print('signed cuboids', len(state))
+    if stats is not None:
+        stats['nodes'] = len(state)
+    return state.on_count()
+
+#
+# Streaming reboot. The instructions are read and applied one at a time,
+# and every so often the state is written out, so that a long run can
+# pick up from its last snapshot instead of starting over. This uses
+# the signed-cuboid state: unlike the octree and the compressed grid it
+# doesn't need to see every instruction before it can start.
+#
+# A snapshot also keeps a hash of the steps it has consumed. Resuming
+# reads the same number of steps from the input again and refuses to go
+# on unless they hash the same, rather than skipping steps it never saw.
+#
+
+def _hash_step(h, toggle: State, cube: Cuboid):
+    h.update(repr((toggle.value, CuboidArray.row(cube))).encode())
+
+def reboot_stream(
+    instrs: ty.Iterable[tuple[State, Cuboid]],
+    snapshot: ty.Optional[str] = None,
+    every: int = 100,
+) -> SignedCuboids:
+    instrs = iter(instrs)
+    h = hashlib.sha256()
+    if snapshot and os.path.exists(snapshot):
+        state = SignedCuboids.load(snapshot)
+        seen = 0
+        for toggle, cube in islice(instrs, state.steps()):
+            _hash_step(h, toggle, cube)
+            seen += 1
+        if seen != state.steps() or h.hexdigest() != state.inputs():
+            raise ValueError(
+                f'{snapshot} was not made from the first {state.steps()} steps of this input')
+        print(f'resuming from {snapshot} after {state.steps()} steps')
+    else:
+        state = SignedCuboids()
+
+    for toggle, cube in instrs:
+        state.set(cube, toggle)
+        _hash_step(h, toggle, cube)
+        if snapshot and state.steps() % every == 0:
+            state.save(snapshot, h.hexdigest())
+
+    if snapshot:
+        state.save(snapshot, h.hexdigest())
+    return state
+
+#
+# Sweep plane. Walk along x through the sorted cuboid boundaries,
+# keeping track of which steps cover the current x slab. Within a slab
+# nothing changes with x, so the lit volume is just the slab's width
+# times the lit area of a 2d problem in y and z: the covering steps,
+# applied in their original order so the last one to touch a cell
+# decides it.
+#
+# That area is kept in a `SlabGrid` as the sweep goes: the y/z plane,
+# compressed like `CompressedGrid`, with each cell holding the newest
+# covering step. A step coming into the slab takes over the cells where
+# it's newer than what's there, and one going out hands its cells back
+# to the newest older step that covers them; either way only cells
+# under that step are touched, and the lit area is adjusted by how much
+# of them changed state. So moving from one slab to the next costs time
+# in proportion to the footprint of the steps that come and go, not to
+# everything covering the slab.
+#
+# A grid compressed over every step would need (2n)^2 cells, so the
+# sweep is cut into blocks of x slabs in which at most `block` new steps
+# start, and each block gets a grid of its own over just the steps it
+# sees, seeded with those already covering it.
+#
+
+class SlabGrid:
+    def __init__(self, steps: np.ndarray, on: np.ndarray, yz: np.ndarray):
+        """
+        A grid for the given step numbers, whose on flags and y/z bounds
+        (laid out as (ymin, ymax + 1, zmin, zmax + 1)) are the rows of
+        `on` and `yz` indexed by step number.
+        """
+        self._steps = np.sort(steps)
+        self._on = on
+        ycuts = np.unique(yz[self._steps, 0:2])
+        zcuts = np.unique(yz[self._steps, 2:4])
+        # cell areas as python ints if the y/z extent could overflow int64
+        dy, dz = np.diff(ycuts), np.diff(zcuts)
+        dtype = int_dtype(int(dy.sum()) * int(dz.sum()))
+        self._dy = dy.astype(dtype)
+        self._dz = dz.astype(dtype)
+        # each step's cell ranges, in the same order as `_steps`
+        self._rects = np.concatenate([
+            np.searchsorted(ycuts, yz[self._steps, 0:2]),
+            np.searchsorted(zcuts, yz[self._steps, 2:4]),
+        ], axis=1)
+        self._active = np.zeros(len(self._steps), dtype=np.bool8)
+        self._top = np.full((len(self._dy), len(self._dz)), -1, dtype=np.int32)
+        # whether each cell is lit, kept alongside so adding a step
+        # doesn't have to look up the on flags under it
+        self._lit = np.zeros(self._top.shape, dtype=np.bool8)
+        self._area = 0
+
+    def cells(self) -> int:
+        return self._top.size
+    def lit_area(self) -> int:
+        return self._area
+
+    def _cell_area(self, y0: int, z0: int, mask: np.ndarray) -> int:
+        ny, nz = mask.shape
+        return int(self._dy[y0:y0 + ny] @ (mask @ self._dz[z0:z0 + nz]))
+
+    def add(self, step: int):
+        i = np.searchsorted(self._steps, step)
+        self._active[i] = True
+        y0, y1, z0, z1 = self._rects[i]
+        top = self._top[y0:y1, z0:z1]
+        lit = self._lit[y0:y1, z0:z1]
+        mine = top < step
+        if self._on[step]:
+            self._area += self._cell_area(y0, z0, mine & ~lit)
+        else:
+            self._area -= self._cell_area(y0, z0, mine & lit)
+        top[mine] = step
+        lit[mine] = self._on[step]
+
+    def remove(self, step: int):
+        i = np.searchsorted(self._steps, step)
+        self._active[i] = False
+        y0, y1, z0, z1 = self._rects[i]
+        top = self._top[y0:y1, z0:z1]
+        mine = top == step
+        if not mine.any():
+            return
+
+        # repaint those cells with the older steps still covering them
+        rects = self._rects[:i]
+        older = np.flatnonzero(
+            self._active[:i] &
+            (rects[:, 0] < y1) & (rects[:, 1] > y0) &
+            (rects[:, 2] < z1) & (rects[:, 3] > z0)
+        )
+        below = np.full(top.shape, -1, dtype=np.int32)
+        for j in older:
+            a0, a1, b0, b1 = rects[j]
+            below[
+                max(a0, y0) - y0 : min(a1, y1) - y0,
+                max(b0, z0) - z0 : min(b1, z1) - z0,
+            ] = self._steps[j]
+
+        lit = (below >= 0) & self._on[np.maximum(below, 0)]
+        if self._on[step]:
+            self._area -= self._cell_area(y0, z0, mine & ~lit)
+        else:
+            self._area += self._cell_area(y0, z0, mine & lit)
+        top[mine] = below[mine]
+        self._lit[y0:y1, z0:z1][mine] = lit[mine]
+
+def lit_sweep(
+    instrs: list[tuple[State, Cuboid]],
+    stats: ty.Optional[dict] = None,
+    block: int = 256,
+) -> int:
+    starts = defaultdict(list)
+    ends = defaultdict(list)
+    for i, (_, cube) in enumerate(instrs):
+        starts[cube.xb.min].append(i)
+        ends[cube.xb.max + 1].append(i)
+    xcuts = sorted(starts.keys() | ends.keys())
+
+    on = np.array([ toggle == State.ON for toggle, _ in instrs ])
+    cubes = CuboidArray.from_cuboids(c for _, c in instrs)
+    yz = cubes.bounds[:, 2:] + np.array([0, 1, 0, 1])
+
+    # cut the sweep into blocks, each starting at most `block` new steps
+    blocks = []
+    first, count = 0, 0
+    for k, x in enumerate(xcuts[:-1]):
+        if count + len(starts[x]) > block and k > first:
+            blocks.append((first, k))
+            first, count = k, 0
+        count += len(starts[x])
+    blocks.append((first, len(xcuts) - 1))
+
+    active: set[int] = set()
+    lit = 0
+    cells = 0
+    for first, last in blocks:
+        entering = [ i for x in xcuts[first:last] for i in starts[x] ]
+        grid = SlabGrid(np.array(list(active) + entering, dtype=np.int64), on, yz)
+        cells = max(cells, grid.cells())
+        for i in active:
+            grid.add(i)
+        for x, xnext in zip(xcuts[first:last], xcuts[first + 1:last + 1]):
+            for i in ends[x]:
+                grid.remove(i)
+                active.discard(i)
+            for i in starts[x]:
+                grid.add(i)
+                active.add(i)
+            lit += (xnext - x) * grid.lit_area()
+    print('sweep slabs', len(xcuts) - 1, 'blocks', len(blocks), 'largest grid', cells)
+    if stats is not None:
+        stats['nodes'] = cells
+    return lit
+
+#
+# Slab decomposition. Cubes in different x slabs never interact, so the
+# bounding box can be cut along x, each slab solved on its own with the
+# steps clipped to it, and the counts added up. The slabs are cut at
+# cuboid x boundaries, spaced so each gets about the same number of
+# boundaries, and farmed out to a process pool. Steps are shipped to
+# the workers as plain (N, 7) integer arrays, which pickle much more
+# cheaply than lists of objects.
+#
+
+def encode_instrs(instrs: list[tuple[State, Cuboid]]) -> np.ndarray:
+    return np.array([
+        (toggle.value, *CuboidArray.row(c)) for toggle, c in instrs
+    ], dtype=np.int64).reshape(-1, 7)
+
+def decode_instrs(rows: np.ndarray) -> list[tuple[State, Cuboid]]:
+    return [
+        (State(int(row[0])), Cuboid.from_bounds(*map(int, row[1:])))
+        for row in rows
+    ]
+
+def solve_slab(engine: str, rows: np.ndarray) -> tuple[int, int]:
+    """The lit count of one slab, and its engine's node count."""
+    if not len(rows):
+        return 0, 0
+    stats = {}
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            lit = ENGINES[engine](decode_instrs(rows), stats=stats)
+    return lit, stats.get('nodes', 0)
+
+def slab_rows(rows: np.ndarray, x0: int, x1: int) -> np.ndarray:
+    """The steps in `rows` clipped to x0 <= x < x1, in order."""
+    keep = (rows[:, 1] < x1) & (rows[:, 2] >= x0)
+    clipped = rows[keep].copy()
+    clipped[:, 1] = np.maximum(clipped[:, 1], x0)
+    clipped[:, 2] = np.minimum(clipped[:, 2], x1 - 1)
+    return clipped
+
+def lit_parallel(
+    instrs: list[tuple[State, Cuboid]],
+    engine: str = 'compressed',
+    workers: ty.Optional[int] = None,
+    slabs: ty.Optional[int] = None,
+    stats: ty.Optional[dict] = None,
+) -> int:
+    rows = encode_instrs(instrs)
+    if not len(rows):
+        return 0
+    workers = workers or os.cpu_count() or 1
+    slabs = slabs or 4 * workers
+
+    xcuts = np.unique(np.concatenate([rows[:, 1], rows[:, 2] + 1]))
+    picks = np.linspace(0, len(xcuts) - 1, slabs + 1).round().astype(int)
+    edges = np.unique(xcuts[picks])
+    print('parallel', len(edges) - 1, 'slabs over', workers, 'workers')
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            partial(solve_slab, engine),
+            [ slab_rows(rows, x0, x1) for x0, x1 in zip(edges, edges[1:]) ]
+        ))
+    if stats is not None:
+        stats['nodes'] = sum(nodes for _, nodes in results)
+    return sum(lit for lit, _ in results)
+
+ENGINES = {
+    'octree': lit_octree,
+    'compressed': lit_compressed,
+    'signed': lit_signed,
+    'sweep': lit_sweep,
+    'parallel': lit_parallel,
+}
+
+#
+# Synthetic workloads. The puzzle only comes with one real input, which
+# says little about how the engines scale, so `random_instrs` makes up
+# reboot sequences from a seed: `n` steps with corners spread over
+# [-span, span) on each axis, side lengths from one of the
+# distributions below capped at `maxside`, and about `on_ratio` of the
+# steps turning cubes on. `write_instrs` saves them in the puzzle's own
+# format.
+#
+
+def uniform_sides(rng, n: int, maxside: int) -> np.ndarray:
+    return rng.integers(1, maxside, size=(n, 3))
+
+def lognormal_sides(rng, n: int, maxside: int) -> np.ndarray:
+    # mostly small boxes with a long tail of big ones, median maxside/20
+    sides = rng.lognormal(np.log(max(maxside / 20, 1)), 1.0, size=(n, 3))
+    return np.clip(sides, 1, maxside).astype(np.int64)
+
+def cube_sides(rng, n: int, maxside: int) -> np.ndarray:
+    return np.repeat(rng.integers(1, maxside, size=(n, 1)), 3, axis=1)
+
+SIDES = {
+    'uniform': uniform_sides,
+    'lognormal': lognormal_sides,
+    'cubes': cube_sides,
+}
+
+def random_instrs(
+    n: int,
+    seed: int = 22,
+    span: int = 100_000,
+    maxside: int = 50_000,
+    on_ratio: float = 0.5,
+    sides: str = 'uniform',
+) -> list[tuple[State, Cuboid]]:
+    rng = np.random.default_rng(seed)
+    lo = rng.integers(-span, span, size=(n, 3))
+    side = SIDES[sides](rng, n, maxside)
+    on = rng.random(n) < on_ratio
+    return [
+        (
+            State.ON if on[i] else State.OFF,
+            Cuboid.from_bounds(*(
+                int(v)
+                for a in range(3)
+                for v in (lo[i, a], lo[i, a] + side[i, a] - 1)
+            ))
+        )
+        for i in range(n)
+    ]
+
+def write_instrs(fname: str, instrs: ty.Iterable[tuple[State, Cuboid]]):
+    with open(fname, 'w') as f:
+        for toggle, c in instrs:
+            print(
+                'on' if toggle == State.ON else 'off',
+                f'x={c.xb.min}..{c.xb.max},'
+                f'y={c.yb.min}..{c.yb.max},'
+                f'z={c.zb.min}..{c.zb.max}',
+                file=f)
+
+# the octree's leaves are dense matrices, so it can't cope with real
+# coordinate ranges: it's only run when the steps lie within this span
+# of the origin.
+OCTREE_MAX_SPAN = 1000
+
+@dataclass
+class Workload:
+    span: int = 100_000
+    sides: str = 'uniform'
+    on_ratio: float = 0.5
+
+    def maxside(self) -> int:
+        return max(self.span // 2, 2)
+    def instrs(self, n: int, seed: int) -> list[tuple[State, Cuboid]]:
+        return random_instrs(
+            n, seed, self.span, self.maxside(), self.on_ratio, self.sides)
+    def __str__(self):
+        return f'span {self.span} {self.sides} on {self.on_ratio:.0%}'
+
+def run_engine(engine: str, rows: np.ndarray) -> dict:
+    """
+    Run one engine on encoded steps, meant to be called in a fresh
+    worker process so that the peak RSS is the run's own.
+    """
+    instrs = decode_instrs(rows)
+    stats = {}
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull):
+                lit = ENGINES[engine](instrs, stats=stats)
+    except MemoryError:
+        return dict(error='out of memory')
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on linux. the parallel engine's work happens
+    # in its own workers, so count the largest of those too.
+    rss = 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return dict(lit=lit, seconds=elapsed, rss=rss, nodes=stats.get('nodes'))
+
+def run_isolated(engine: str, rows: np.ndarray) -> dict:
+    # spawn rather than fork, so the worker doesn't start out with the
+    # parent's memory already counted against it.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        try:
+            return pool.submit(run_engine, engine, rows).result()
+        except BrokenProcessPool:
+            return dict(error='worker died')
+
+def benchmark(
+    sizes=(1000, 2000, 5000, 10000, 20000),
+    engines=None,
+    seed: int = 22,
+    workloads: ty.Sequence[Workload] = (Workload(),),
+    budget: float = 60.0,
+) -> list[dict]:
+    """
+    Run each engine on random reboot sequences of increasing length for
+    each workload, reporting time, peak RSS and node count. Once an
+    engine fails, or takes longer than `budget` seconds, it's dropped
+    from the larger sizes of that workload.
+    """
+    engines = list(engines or ENGINES)
+    results = []
+    for workload in workloads:
+        print(workload)
+        dropped: dict[str, str] = {}
+        if workload.span + workload.maxside() > OCTREE_MAX_SPAN:
+            dropped['octree'] = 'coordinates too large'
+        for n in sizes:
+            rows = encode_instrs(workload.instrs(n, seed))
+            lit = {}
+            for engine in engines:
+                if engine in dropped:
+                    print(f'{n:>6} {engine:>10}  skipped ({dropped[engine]})')
+                    continue
+                r = run_isolated(engine, rows)
+                results.append(dict(
+                    r, engine=engine, steps=n, seed=seed,
+                    span=workload.span, sides=workload.sides,
+                    on_ratio=workload.on_ratio))
+                if 'error' in r:
+                    dropped[engine] = f'{r["error"]} at {n}'
+                    print(f'{n:>6} {engine:>10}  {r["error"]}')
+                    continue
+                if r['seconds'] > budget:
+                    dropped[engine] = f'over {budget:.0f}s at {n}'
+                lit[engine] = r['lit']
+                print(" ".join([
+                    f'{n:>6} {engine:>10}',
+                    f'{r["seconds"]:9.3f}s',
+                    f'rss {r["rss"] / 2**20:8.1f}MiB',
+                    f'nodes {r["nodes"]:>10}',
+                    f'lit {r["lit"]}',
+                ]))
+            assert len(set(lit.values())) <= 1, f'engines disagree: {lit}'
+    return results
+
+BENCH_WORKLOADS = [
+    Workload(span, sides, on_ratio)
+    for span in (300, 100_000)
+    for sides in ('uniform', 'lognormal')
+    for on_ratio in (0.5, 0.8)
+]
+
+def part2(fname: str, engine: str = 'compressed'):
+    instrs = read_input(fname)
+    lit = ENGINES[engine](instrs)
+    print(f'part 2: total lit {lit}')
 
 if __name__ == '__main__':
+    if sys.argv[1] == 'stream':
+        # stream input snapshot [every]
+        every = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+        state = reboot_stream(iter_input(sys.argv[2]), sys.argv[3], every)
+        print(f'part 2: total lit {state.on_count()}')
+        exit(0)
+    if sys.argv[1] == 'gen':
+        # gen output steps [seed span on_ratio sides]
+        args = sys.argv[2:] + [None] * 6
+        fname, n, seed, span, on_ratio, sides = args[:6]
+        workload = Workload(
+            int(span or 100_000), sides or 'uniform', float(on_ratio or 0.5))
+        write_instrs(fname, workload.instrs(int(n), int(seed or 22)))
+        exit(0)
+    if sys.argv[1] == 'bench':
+        # bench [sizes...]
+        sizes = tuple(map(int, sys.argv[2:])) or (1000, 2000, 5000, 10000, 20000)
+        benchmark(sizes, workloads=BENCH_WORKLOADS)
+        exit(0)
     part1(sys.argv[1])
-    part2(sys.argv[1])
+    part2(sys.argv[1], *sys.argv[2:3])
     exit(0)
 
 warn = partial(print, file=sys.stderr)
@@ -546,14 +1465,37 @@ class CubeNodeTests(unittest.TestCase):
         node.set(subcube, State.ON)
         node.set(subcube, State.OFF)
         self.assertEqual(0, node.on_count())
-        self.assertEqual(2, node.maxheight())
+        self.assertEqual(1, node.maxheight())
     def test_light_then_clear_subcube(self):
         node = self.make_node(0, 127, 0, 127, 0, 127)
         subcube = node.box().split()[0]
         node.set(subcube, State.ON)
         node.set(subcube, State.OFF)
         self.assertEqual(0, node.on_count())
-        self.assertEqual(2, node.maxheight())
+        self.assertEqual(1, node.maxheight())
+    def test_cached_stats_match_tree(self):
+        node = self.make_node(0, 511, 0, 511, 0, 511)
+        rng = np.random.default_rng(15)
+        for _ in range(30):
+            lo = rng.integers(0, 512, size=3)
+            hi = [ int(rng.integers(l, 512)) for l in lo ]
+            state = State.ON if rng.random() < 0.6 else State.OFF
+            node.set(
+                Cuboid.from_bounds(
+                    int(lo[0]), hi[0], int(lo[1]), hi[1], int(lo[2]), hi[2]),
+                state
+            )
+            nodes, heights = [], []
+            def visitor(tag, n, depth):
+                if tag not in ['leaf', 'before node']:
+                    return
+                nodes.append(n)
+                if tag == 'leaf' or not n._expanded:
+                    heights.append(depth + 1)
+            node.visit(visitor)
+            self.assertEqual(len(nodes), node.nodecount())
+            self.assertEqual(min(heights), node.minheight())
+            self.assertEqual(max(heights), node.maxheight())
     def test_light_two_subcubes(self):
         node = self.make_node(0, 127, 0, 127, 0, 127)
         splits = node.box().split()
@@ -609,6 +1551,34 @@ class CubeLeafTests(unittest.TestCase):
         )
         self.assertEqual(node.box().volume(), node.on_count())
 
+    def test_matches_dense_matrix(self):
+        box = Cuboid.from_bounds(0, 6, -3, 4, 0, 20)
+        node = CubeLeaf(box)
+        dense = np.zeros(box.shape(), dtype=np.bool8)
+        rng = np.random.default_rng(14)
+        for _ in range(200):
+            lo = rng.integers(0, box.shape())
+            hi = [ int(rng.integers(l, n)) for l, n in zip(lo, box.shape()) ]
+            state = State.ON if rng.random() < 0.5 else State.OFF
+            region = Cuboid.from_bounds(
+                int(lo[0]), hi[0],
+                int(lo[1]) - 3, hi[1] - 3,
+                int(lo[2]), hi[2],
+            )
+            node.set(region, state)
+            dense[lo[0] : hi[0] + 1, lo[1] : hi[1] + 1, lo[2] : hi[2] + 1] = state.value
+            self.assertEqual(int(dense.sum()), node.on_count())
+    def test_packed_storage(self):
+        node = CubeLeaf(Cuboid.from_bounds(0, 99, 0, 99, 0, 99))
+        node.set(Cuboid.from_bounds(0, 0, 0, 0, 0, 0), State.ON)
+        self.assertEqual(100 * 100 * 13, node._mat.nbytes)
+    def test_uniform_matrix_collapses(self):
+        node = CubeLeaf(Cuboid.from_bounds(0, 9, 0, 9, 0, 9))
+        node.set(Cuboid.from_bounds(0, 4, 0, 9, 0, 9), State.ON)
+        node.set(Cuboid.from_bounds(5, 9, 0, 9, 0, 9), State.ON)
+        self.assertIsNone(node._mat)
+        self.assertEqual(1000, node.on_count())
+
 class IntersectionTests(unittest.TestCase):
     def test_bounds_has(self):
         b = Bounds(0, 10)
@@ -676,6 +1646,36 @@ class IntersectionTests(unittest.TestCase):
             self.assertIsNone(result, f'case {i}')
 
 
+class CuboidArrayTests(unittest.TestCase):
+    def test_intersect_matches_cuboid(self):
+        cubes = [ c for _, c in random_instrs(50, seed=19, span=100, maxside=60) ]
+        array = CuboidArray.from_cuboids(cubes)
+        for region in cubes[:10]:
+            mask, overlap = array.intersect(region)
+            for i, cube in enumerate(cubes):
+                expected = cube.intersection(region)
+                self.assertEqual(expected is not None, mask[i])
+                if expected:
+                    self.assertEqual(expected, CuboidArray(overlap)[i])
+    def test_touching_faces_overlap(self):
+        array = CuboidArray.from_cuboids([
+            Cuboid.from_bounds(0, 4, 0, 4, 0, 4),
+            Cuboid.from_bounds(5, 9, 0, 4, 0, 4),
+        ])
+        mask, overlap = array.intersect(Cuboid.from_bounds(4, 4, 0, 0, 0, 0))
+        self.assertEqual([True, False], mask.tolist())
+        self.assertEqual([4, 4, 0, 0, 0, 0], overlap[0].tolist())
+    def test_volumes_dont_overflow(self):
+        big = 10**12
+        array = CuboidArray.from_cuboids([
+            Cuboid.from_bounds(-big, big, -big, big, -big, big),
+        ])
+        self.assertEqual((2 * big + 1)**3, array.volumes()[0])
+    def test_roundtrip(self):
+        cubes = [ c for _, c in random_instrs(10, seed=2) ]
+        self.assertEqual(cubes, list(CuboidArray.from_cuboids(cubes)))
+        self.assertEqual(0, len(CuboidArray()))
+
 class SplitTests(unittest.TestCase):
     def test_bounds_splitting(self):
         b = Bounds(-10, 10)
@@ -705,4 +1705,256 @@ class SplitTests(unittest.TestCase):
             c = Cuboid.from_bounds(*expected)
             self.assertIn(c, splits)
             splits.remove(c)
-        self.assertEqual(0, len(splits))
\ No newline at end of file
+        self.assertEqual(0, len(splits))
+class EngineTests(unittest.TestCase):
+    ENGINES = ['compressed', 'signed', 'sweep', 'parallel']
+    def test_example_1(self):
+        input = [
+            (State.ON,  (10, 12, 10, 12, 10, 12)),
+            (State.ON,  (11, 13, 11, 13, 11, 13)),
+            (State.OFF, (9, 11, 9, 11, 9, 11)),
+            (State.ON,  (10, 10, 10, 10, 10, 10)),
+        ]
+        instrs = [
+            (state, Cuboid.from_bounds(*bounds))
+            for state, bounds in input
+        ]
+        for engine in self.ENGINES:
+            self.assertEqual(39, ENGINES[engine](instrs), engine)
+    def test_example_3(self):
+        fname = os.path.join(os.path.dirname(__file__), 'ex3.txt')
+        for engine in self.ENGINES:
+            self.assertEqual(
+                2758514936282235,
+                ENGINES[engine](read_input(fname)),
+                engine
+            )
+    def test_huge_coordinates(self):
+        big = 10**12
+        instrs = [
+            (State.ON, Cuboid.from_bounds(-big, big, -big, big, -big, big)),
+            (State.OFF, Cuboid.from_bounds(0, big, 0, big, 0, big)),
+        ]
+        expected = (2 * big + 1)**3 - (big + 1)**3
+        for engine in self.ENGINES:
+            self.assertEqual(expected, ENGINES[engine](instrs), engine)
+    def test_empty(self):
+        for engine in self.ENGINES:
+            self.assertEqual(0, ENGINES[engine]([]), engine)
+
+class CompressedGridTests(unittest.TestCase):
+    def test_compressed_shape(self):
+        grid = CompressedGrid([
+            Cuboid.from_bounds(0, 9, 0, 9, 0, 9),
+            Cuboid.from_bounds(5, 14, 0, 9, 20, 29),
+        ])
+        self.assertEqual((3, 1, 3), grid.shape())
+
+class LitCountTests(unittest.TestCase):
+    def setUp(self):
+        self.instrs = random_instrs(40, seed=16, span=60, maxside=50)
+        lo, hi = -60, 110
+        self.box = Cuboid.from_bounds(lo, hi, lo, hi, lo, hi)
+        self.dense = np.zeros(self.box.shape(), dtype=np.bool8)
+        for toggle, c in self.instrs:
+            self.dense[
+                c.xb.min - lo : c.xb.max - lo + 1,
+                c.yb.min - lo : c.yb.max - lo + 1,
+                c.zb.min - lo : c.zb.max - lo + 1,
+            ] = toggle.value
+        rng = np.random.default_rng(16)
+        self.queries = []
+        for _ in range(100):
+            a = rng.integers(lo - 10, hi + 10, size=3)
+            b = rng.integers(lo - 10, hi + 10, size=3)
+            bounds = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+            self.queries.append(bounds.ravel())
+    def expected(self, q):
+        lo = self.box.xb.min
+        xs, ys, zs = (
+            slice(max(q[2*a] - lo, 0), max(q[2*a + 1] - lo + 1, 0))
+            for a in range(3)
+        )
+        return int(self.dense[xs, ys, zs].sum())
+    def test_signed(self):
+        state = reboot_signed(self.instrs)
+        for chunk in [1, 500, 1 << 20]:
+            counts = state.lit_counts(np.array(self.queries), chunk)
+            for q, count in zip(self.queries, counts):
+                self.assertEqual(self.expected(q), count, q)
+        for q in self.queries[:10]:
+            self.assertEqual(self.expected(q), state.lit_count(Cuboid.from_bounds(*q)))
+    def test_signed_huge_coordinates(self):
+        big = 10**12
+        state = reboot_signed([
+            (State.ON, Cuboid.from_bounds(-big, big, -big, big, -big, big)),
+            (State.OFF, Cuboid.from_bounds(0, big, 0, big, 0, big)),
+        ])
+        counts = state.lit_counts([
+            (-big, big, -big, big, -big, big),
+            (0, big, 0, big, -1, -1),
+            (1, 1, 1, 1, 1, 1),
+        ])
+        self.assertEqual(
+            [(2 * big + 1)**3 - (big + 1)**3, (big + 1)**2, 0], list(counts))
+    def test_signed_sum_overflows(self):
+        # each entry's volume fits in int64, but their sum doesn't
+        side = (1 << 20) - 1
+        state = reboot_signed([
+            (State.ON, Cuboid.from_bounds(i * side, (i + 1) * side - 1, 0, side - 1, 0, side - 1))
+            for i in range(9)
+        ])
+        self.assertEqual(9 * side**3, state.on_count())
+        self.assertEqual(
+            9 * side**3, state.lit_count(Cuboid.from_bounds(0, 9 * side, 0, side, 0, side)))
+    def test_octree(self):
+        node = CubeNode(self.box)
+        for toggle, cube in self.instrs:
+            node.set(cube, toggle)
+        counts = node.lit_counts(np.array(self.queries))
+        for q, count in zip(self.queries, counts):
+            self.assertEqual(self.expected(q), node.lit_count(Cuboid.from_bounds(*q)), q)
+            self.assertEqual(self.expected(q), count, q)
+    def test_leaf(self):
+        leaf = CubeLeaf(self.box)
+        for toggle, cube in self.instrs:
+            leaf.set(cube, toggle)
+        counts = leaf.lit_counts(np.array(self.queries))
+        for q, count in zip(self.queries, counts):
+            self.assertEqual(self.expected(q), leaf.lit_count(Cuboid.from_bounds(*q)), q)
+            self.assertEqual(self.expected(q), count, q)
+    def test_octree_huge_box(self):
+        # (2 * big + 1)**3 overflows int64
+        big = 10**7
+        node = CubeNode(Cuboid.from_bounds(-big, big, -big, big, -big, big), lit=True)
+        node.set(Cuboid.from_bounds(0, 999, 0, 999, 0, 999), State.OFF)
+        counts = node.lit_counts([
+            (-big, big, -big, big, -big, big),
+            (0, 1999, 0, 1999, 0, 0),
+            (0, 999, 0, 999, 0, 999),
+        ])
+        self.assertEqual([(2 * big + 1)**3 - 1000**3, 2000**2 - 1000**2, 0], list(counts))
+
+class ParallelTests(unittest.TestCase):
+    def test_slab_counts_agree(self):
+        instrs = random_instrs(40, seed=18, span=300, maxside=200)
+        expected = lit_signed(instrs)
+        for slabs in [1, 2, 7, 100]:
+            for engine in ['compressed', 'sweep']:
+                self.assertEqual(
+                    expected,
+                    lit_parallel(instrs, engine, workers=2, slabs=slabs),
+                    (slabs, engine))
+    def test_slab_rows_clip(self):
+        rows = encode_instrs(random_instrs(20, seed=5, span=100, maxside=60))
+        for x0, x1 in [(-100, -20), (-20, 0), (0, 100)]:
+            clipped = slab_rows(rows, x0, x1)
+            self.assertTrue((clipped[:, 1] >= x0).all())
+            self.assertTrue((clipped[:, 2] < x1).all())
+            self.assertTrue((clipped[:, 1] <= clipped[:, 2]).all())
+    def test_encode_roundtrip(self):
+        instrs = random_instrs(10, seed=3)
+        self.assertEqual(instrs, decode_instrs(encode_instrs(instrs)))
+
+class SweepTests(unittest.TestCase):
+    def test_blocks_agree(self):
+        for seed in range(5):
+            instrs = random_instrs(60, seed=seed, span=200, maxside=150)
+            expected = lit_signed(instrs)
+            for block in [1, 3, 20, 1000]:
+                self.assertEqual(expected, lit_sweep(instrs, block=block), (seed, block))
+    def test_slab_grid_add_remove(self):
+        instrs = random_instrs(30, seed=13, span=20, maxside=15)
+        on = np.array([ toggle == State.ON for toggle, _ in instrs ])
+        yz = CuboidArray.from_cuboids(c for _, c in instrs).bounds[:, 2:] + [0, 1, 0, 1]
+        grid = SlabGrid(np.arange(len(instrs)), on, yz)
+
+        def expected(active):
+            dense = np.zeros((60, 60), dtype=bool)
+            for i in sorted(active):
+                y0, y1, z0, z1 = yz[i] + 20
+                dense[y0:y1, z0:z1] = on[i]
+            return int(dense.sum())
+
+        rng = np.random.default_rng(13)
+        active = set()
+        for _ in range(200):
+            i = int(rng.integers(len(instrs)))
+            if i in active:
+                grid.remove(i)
+                active.discard(i)
+            else:
+                grid.add(i)
+                active.add(i)
+            self.assertEqual(expected(active), grid.lit_area())
+
+class WorkloadTests(unittest.TestCase):
+    def test_seeded(self):
+        for sides in SIDES:
+            w = Workload(500, sides, 0.7)
+            self.assertEqual(w.instrs(30, seed=4), w.instrs(30, seed=4))
+            self.assertNotEqual(w.instrs(30, seed=4), w.instrs(30, seed=5))
+    def test_parameters(self):
+        instrs = random_instrs(
+            2000, seed=6, span=100, maxside=40, on_ratio=0.8, sides='lognormal')
+        on = sum(toggle == State.ON for toggle, _ in instrs)
+        self.assertAlmostEqual(0.8, on / len(instrs), delta=0.05)
+        for _, c in instrs:
+            self.assertTrue(-100 <= c.xb.min < 100)
+            self.assertTrue(1 <= c.xb.length() <= 40)
+        for _, c in random_instrs(50, seed=6, sides='cubes'):
+            self.assertEqual(1, len(set(c.shape())))
+    def test_write_roundtrip(self):
+        instrs = random_instrs(25, seed=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'reboot.txt')
+            write_instrs(fname, instrs)
+            self.assertEqual(instrs, read_input(fname))
+    def test_run_engine(self):
+        rows = encode_instrs(random_instrs(30, seed=9, span=50, maxside=30))
+        results = [ run_engine(engine, rows) for engine in ['compressed', 'signed', 'sweep'] ]
+        self.assertEqual(1, len({ r['lit'] for r in results }))
+        for r in results:
+            self.assertGreater(r['nodes'], 0)
+            self.assertGreater(r['rss'], 0)
+
+class StreamingTests(unittest.TestCase):
+    def test_resume_from_snapshot(self):
+        instrs = random_instrs(60, seed=17, span=200, maxside=150)
+        expected = lit_signed(instrs)
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, 'reboot.npz')
+
+            class Crash(Exception): pass
+            def crashing(instrs, after):
+                for i, instr in enumerate(instrs):
+                    if i == after:
+                        raise Crash()
+                    yield instr
+
+            with self.assertRaises(Crash):
+                reboot_stream(crashing(instrs, 45), snapshot, every=10)
+            self.assertEqual(40, SignedCuboids.load(snapshot).steps())
+
+            state = reboot_stream(iter(instrs), snapshot, every=10)
+            self.assertEqual(60, state.steps())
+            self.assertEqual(expected, state.on_count())
+    def test_resume_refuses_other_input(self):
+        instrs = random_instrs(30, seed=17, span=200, maxside=150)
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, 'reboot.npz')
+            reboot_stream(iter(instrs[:20]), snapshot, every=10)
+
+            edited = instrs[:]
+            toggle, cube = edited[5]
+            edited[5] = (State.OFF if toggle == State.ON else State.ON, cube)
+            with self.assertRaises(ValueError):
+                reboot_stream(iter(edited), snapshot)
+            with self.assertRaises(ValueError):
+                reboot_stream(iter(instrs[:10]), snapshot)
+            self.assertEqual(
+                lit_signed(instrs), reboot_stream(iter(instrs), snapshot).on_count())
+    def test_iter_input(self):
+        fname = os.path.join(os.path.dirname(__file__), 'ex3.txt')
+        state = reboot_stream(iter_input(fname))
+        self.assertEqual(2758514936282235, state.on_count())
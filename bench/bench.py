@@ -0,0 +1,196 @@
+"""
+Benchmark runner for the daily solvers.
+
+Each day's script is imported as a module and its `read_input`, `part1`
+and `part2` are timed separately, after some warmup runs, using the
+`StopWatch` from day 15. Peak memory for each phase is measured in one
+further run under `tracemalloc`, since tracing slows everything down
+too much to time at the same time.
+
+Results are written as JSON. Given a baseline file from an earlier run,
+any phase whose best time has grown by more than the threshold is
+reported and the runner exits with a non-zero status. The baseline
+can't be the output file itself, and results already in the output
+file for days that weren't run this time are kept.
+
+    python bench/bench.py [--repeat N] [--warmup N] [--output FILE]
+                          [--baseline FILE] [--threshold FRACTION]
+                          [DAY ...]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tracemalloc
+import typing as ty
+from dataclasses import dataclass, asdict, field
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@dataclass
+class Day:
+    name: str
+    script: str
+    input: str
+    phases: tuple[str, ...] = ('parse', 'part1', 'part2')
+
+# days whose scripts read sys.argv at import time, or don't take an
+# input file at all, aren't listed.
+DAYS = [
+    Day('04', '04/squid.py', '04/input.txt', ('part1', 'part2')),
+    Day('05', '05/thermal.py', '05/input.txt', ('part1', 'part2')),
+    Day('06', '06/fish.py', '06/input.txt', ('part1', 'part2')),
+    Day('07', '07/crab.py', '07/input.txt', ('part1', 'part2')),
+    Day('08', '08/08.py', '08/input.txt'),
+    Day('09', '09/09.py', '09/input.txt', ('part1', 'part2')),
+    Day('11', '11/11.py', '11/input.txt', ('part1', 'part2')),
+    Day('12', '12/12.py', '12/input.txt', ('parse', 'part1')),
+    Day('13', '13/13.py', '13/input.txt'),
+    Day('14', '14/14.py', '14/input.txt'),
+    Day('15', '15/15.py', '15/input.txt'),
+    Day('16', '16/16.py', '16/input.txt', ('parse', 'part1')),
+    Day('17', '17/17.py', '17/input.txt', ('parse', 'part1')),
+    Day('18', '18/snail.py', '18/input.txt'),
+    Day('20', '20/map.py', '20/input.txt', ('parse', 'part1')),
+    Day('22', '22/reactor.py', '22/input.txt'),
+    Day('25', '25/cuke.py', '25/input.txt', ('parse', 'part1')),
+]
+
+def load_module(name: str, script: str):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ROOT, script))
+    module = importlib.util.module_from_spec(spec)
+    # some days change numpy's global error handling when imported, so
+    # don't let that leak into whichever day is measured next.
+    with np.errstate():
+        spec.loader.exec_module(module)
+    return module
+
+StopWatch = load_module('day15', '15/15.py').StopWatch
+
+@dataclass
+class PhaseResult:
+    times: list[float] = field(default_factory=list)
+    peak_bytes: int = 0
+
+    def best(self) -> float:
+        return min(self.times)
+    def mean(self) -> float:
+        return sum(self.times) / len(self.times)
+
+def quietly(f: ty.Callable[[], ty.Any]):
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            return f()
+
+def measure(f: ty.Callable[[], ty.Any], warmup: int, repeat: int) -> PhaseResult:
+    result = PhaseResult()
+    for _ in range(warmup):
+        quietly(f)
+    for _ in range(repeat):
+        timer = StopWatch()
+        quietly(f)
+        result.times.append(timer.elapsed())
+
+    tracemalloc.start()
+    try:
+        quietly(f)
+        _, result.peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result
+
+def run_day(day: Day, warmup: int, repeat: int) -> dict[str, PhaseResult]:
+    module = load_module(f'day{day.name}', day.script)
+    fname = os.path.join(ROOT, day.input)
+    calls = {
+        'parse': lambda: module.read_input(fname),
+        'part1': lambda: module.part1(fname),
+        'part2': lambda: module.part2(fname),
+    }
+    return {
+        phase: measure(calls[phase], warmup, repeat)
+        for phase in day.phases
+    }
+
+def compare(
+    results: dict,
+    baseline: dict,
+    threshold: float
+) -> list[tuple[str, str, float, float]]:
+    regressions = []
+    for name, phases in results.items():
+        for phase, r in phases.items():
+            try:
+                before = baseline[name][phase]['best']
+            except KeyError:
+                continue
+            if r['best'] > before * (1 + threshold):
+                regressions.append((name, phase, before, r['best']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the daily solvers')
+    parser.add_argument('days', nargs='*', help='days to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.10,
+        help='flag phases slower than baseline by more than this fraction')
+    args = parser.parse_args()
+
+    # read the baseline before anything is written, and don't let a run
+    # overwrite the file it's being compared against.
+    baseline = None
+    if args.baseline:
+        if os.path.abspath(args.baseline) == os.path.abspath(args.output):
+            parser.error('--baseline and --output must be different files')
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    # keep earlier results for any days not run this time
+    previous = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            previous = json.load(f).get('results', {})
+
+    days = [ d for d in DAYS if not args.days or d.name in args.days ]
+    results = {}
+    for day in days:
+        timings = run_day(day, args.warmup, args.repeat)
+        results[day.name] = {}
+        for phase, r in timings.items():
+            results[day.name][phase] = dict(
+                asdict(r), best=r.best(), mean=r.mean())
+            print(" ".join([
+                f'{day.name} {phase:<5}',
+                f'best {r.best():9.4f}s',
+                f'mean {r.mean():9.4f}s',
+                f'peak {r.peak_bytes / 2**20:9.2f}MiB',
+            ]))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'results': previous | results,
+        }, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for name, phase, before, after in regressions:
+        print(f'REGRESSION {name} {phase}: {before:.4f}s -> {after:.4f}s ({after / before - 1:+.1%})')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())